@@ -1,20 +1,46 @@
-from flask import Flask, send_from_directory
+from flask import Flask, Request, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from config import Config
+from app.utils.token_store import RevocationStore, IdentityCache
+from app.utils.jobs import JobRunner
+from app.utils.storage import init_storage, send_stored
 import os
 
 db = SQLAlchemy()
 jwt = JWTManager()
+revocations = RevocationStore()
+identity_cache = IdentityCache()
+jobs = JobRunner()
 
-def create_app():
+
+class AppRequest(Request):
+    # 导入接口的上传上限单独配置，其余接口仍使用 MAX_CONTENT_LENGTH
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'transfer.import_data':
+            return current_app.config['IMPORT_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return revocations.is_revoked(jwt_payload)
+
+
+def create_app(config_class=Config):
     app = Flask(__name__, static_folder='static')
-    app.config.from_object(Config)
+    app.request_class = AppRequest
+    app.config.from_object(config_class)
     
     # 初始化扩展
     db.init_app(app)
     jwt.init_app(app)
+    revocations.init_app(app)
+    identity_cache.init_app(app)
+    jobs.init_app(app)
+    init_storage(app)
     
     # 配置 CORS
     CORS(app, 
@@ -26,14 +52,32 @@ def create_app():
     # 添加静态文件路由
     @app.route('/uploads/<path:filename>')
     def serve_upload(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return send_stored(filename)
     
     # 注册蓝图
-    from app.routes import auth, map, journal, photo, track
+    from app.routes import auth, map, journal, photo, track, transfer, stats, jobs as job_routes
     app.register_blueprint(auth.bp)
     app.register_blueprint(map.bp)
     app.register_blueprint(journal.bp)
     app.register_blueprint(photo.bp)
     app.register_blueprint(track.bp)
+    app.register_blueprint(transfer.bp)
+    app.register_blueprint(stats.bp)
+    app.register_blueprint(job_routes.bp)
+    
+    # 建表不在启动时执行，部署时显式运行一次：flask --app run init-db
+    @app.cli.command('init-db')
+    def init_db():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        if not os.path.exists(upload_folder):
+            os.makedirs(upload_folder, mode=0o755)
+        db.create_all()
+        print('数据库已初始化')
+    
+    # 根据业务表重新计算统计汇总：flask --app run rebuild-stats
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats():
+        from app.utils.rollups import rebuild
+        print(f'已重建 {rebuild()} 个用户的统计数据')
     
     return app
\ No newline at end of file
@@ -0,0 +1,26 @@
+from app import db
+from datetime import datetime
+
+class ImportLog(db.Model):
+    # 一次文件导入（按用户 + 文件内容哈希唯一），processed 是已提交的元素数量，重试时从这里继续
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    source_hash = db.Column(db.String(64), nullable=False)
+    format = db.Column(db.String(8), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='running')  # running / done / failed
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    tracks = db.Column(db.Integer, nullable=False, default=0)
+    markers = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'source_hash'),)
+
+class ImportedItem(db.Model):
+    # 导入产生的每一条路线/标记，记录它来自哪次导入
+    id = db.Column(db.Integer, primary_key=True)
+    import_id = db.Column(db.Integer, db.ForeignKey('import_log.id'), nullable=False, index=True)
+    kind = db.Column(db.String(8), nullable=False)  # track / marker
+    row_id = db.Column(db.Integer, nullable=False)
@@ -10,4 +10,11 @@ class Photo(db.Model):
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) 
\ No newline at end of file
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) 
+
+class ConfirmedUpload(db.Model):
+    # 已确认的直传文件，filename 唯一：同一个上传凭证并发或重复提交时只能创建一条照片记录
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from app import db
+
+class UserRollup(db.Model):
+    # 按用户、按天/按月预先汇总的统计数据，由各模块的创建/删除接口增量维护
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period = db.Column(db.String(8), nullable=False)  # day / month
+    period_start = db.Column(db.Date, nullable=False)
+    journals = db.Column(db.Integer, nullable=False, default=0)
+    tracks = db.Column(db.Integer, nullable=False, default=0)
+    distance = db.Column(db.Float, nullable=False, default=0)  # 单位：米
+    photos = db.Column(db.Integer, nullable=False, default=0)
+    markers = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'period', 'period_start'),)
+
+class PlaceRollup(db.Model):
+    # 按经纬度网格汇总的照片数量，网格编号 = floor(坐标 / 网格大小)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    cell_lat = db.Column(db.Integer, nullable=False)
+    cell_lng = db.Column(db.Integer, nullable=False)
+    photos = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'cell_lat', 'cell_lng'),)
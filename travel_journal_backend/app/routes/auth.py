@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import (create_access_token, create_refresh_token, jwt_required,
+                                get_jwt_identity, get_jwt, decode_token)
 from app.models.user import User
-from app import db
+from app import db, revocations, identity_cache
+from app.utils.rollups import delete_user_rollups
 from datetime import datetime
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -34,27 +36,66 @@ def login():
     
     if user and user.check_password(data['password']):
         access_token = create_access_token(identity=user.id)
-        return jsonify({'token': access_token}), 200
+        refresh_token = create_refresh_token(identity=user.id)
+        return jsonify({'token': access_token, 'refresh_token': refresh_token}), 200
         
     return jsonify({'error': '用户名或密码错误'}), 401
 
+@bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    # 吊销列表只在本进程内存中（未配置 Redis 时），重启或其他进程上不可见；
+    # 刷新最多每个访问令牌有效期一次，这里查库确认账户仍然存在
+    user_id = get_jwt_identity()
+    if User.query.get(user_id) is None:
+        return jsonify({'error': '账户不存在'}), 401
+    access_token = create_access_token(identity=user_id)
+    return jsonify({'token': access_token}), 200
+
+@bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    token = get_jwt()
+    revocations.revoke_token(token['jti'], token['exp'])
+    
+    # 同时吊销客户端提交的刷新令牌
+    data = request.get_json(silent=True) or {}
+    if data.get('refresh_token'):
+        try:
+            refresh_token = decode_token(data['refresh_token'])
+            if str(refresh_token['sub']) == str(token['sub']):
+                revocations.revoke_token(refresh_token['jti'], refresh_token['exp'])
+        except Exception as e:
+            print(f"Logout error: {str(e)}")
+    
+    return jsonify({'message': '已退出登录'})
+
+def _profile_data(user):
+    return {
+        'username': user.username,
+        'email': user.email,
+        'nickname': user.nickname,
+        'birthday': user.birthday.strftime('%Y-%m-%d') if user.birthday else None,
+        'phone': user.phone,
+        'preferences': user.preferences
+    }
+
 @bp.route('/profile', methods=['GET', 'PUT', 'DELETE'])
 @jwt_required()
 def profile():
     user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
     
     if request.method == 'GET':
-        return jsonify({
-            'username': user.username,
-            'email': user.email,
-            'nickname': user.nickname,
-            'birthday': user.birthday.strftime('%Y-%m-%d') if user.birthday else None,
-            'phone': user.phone,
-            'preferences': user.preferences
-        })
+        # 优先读缓存，命中时不访问数据库
+        profile_data = identity_cache.get(user_id)
+        if profile_data is None:
+            profile_data = _profile_data(User.query.get_or_404(user_id))
+            identity_cache.set(user_id, profile_data)
+        return jsonify(profile_data)
+    
+    user = User.query.get_or_404(user_id)
     
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         data = request.get_json()
         user.nickname = data.get('nickname', user.nickname)
         user.email = data.get('email', user.email)
@@ -63,11 +104,16 @@ def profile():
         user.phone = data.get('phone', user.phone)
         user.preferences = data.get('preferences', user.preferences)
         db.session.commit()
+        identity_cache.invalidate(user_id)
         return jsonify({'message': '个人信息已更新'})
     
     else:  # DELETE
         db.session.delete(user)
+        delete_user_rollups(user_id)
         db.session.commit()
+        # 已签发的令牌立即失效，不必等到过期
+        revocations.revoke_user(user_id)
+        identity_cache.invalidate(user_id)
         return jsonify({'message': '账户已删除'}) 
 
 @bp.route('/health', methods=['GET'])
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import jobs
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+@bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def job_status(job_id):
+    job = jobs.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    return jsonify({
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error']
+    })
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.journal import Journal
 from app import db
+from app.utils.rollups import record
 from datetime import datetime
 
 bp = Blueprint('journal', __name__, url_prefix='/api/journal')
@@ -28,6 +29,7 @@ def journals():
         user_id=user_id
     )
     db.session.add(journal)
+    record(user_id, journal.created_at, journals=1)
     db.session.commit()
     
     return jsonify({
@@ -61,5 +63,6 @@ def journal_detail(journal_id):
     
     else:  # DELETE
         db.session.delete(journal)
+        record(user_id, journal.created_at, journals=-1)
         db.session.commit()
         return jsonify({'message': '日志已删除'}) 
\ No newline at end of file
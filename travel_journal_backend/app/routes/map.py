@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.marker import Marker
 from app import db
+from app.utils.rollups import record
 
 bp = Blueprint('map', __name__, url_prefix='/api/map')
 
@@ -52,6 +53,7 @@ def markers():
         )
         
         db.session.add(marker)
+        record(user_id, marker.created_at, markers=1)
         db.session.commit()
         
         response_data = {
@@ -74,6 +76,7 @@ def delete_marker(marker_id):
     try:
         marker = Marker.query.filter_by(id=marker_id, user_id=user_id).first_or_404()
         db.session.delete(marker)
+        record(user_id, marker.created_at, markers=-1)
         db.session.commit()
         return jsonify({'message': '标记已删除'})
     except Exception as e:
@@ -1,14 +1,49 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models.photo import Photo
-from app import db
+from app.models.photo import Photo, ConfirmedUpload
+from app import db, jobs
+from app.utils.io_pool import run_blocking
+from app.utils.geotag import geotag_photos
+from app.utils.rollups import record, record_place
+from app.utils.storage import get_storage, send_stored
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy.exc import IntegrityError
 import os
 import uuid
 from werkzeug.utils import secure_filename
-from PIL import Image
 
 bp = Blueprint('photo', __name__, url_prefix='/api/photo')
 
+def _new_filename(original_filename):
+    # 生成安全的文件名
+    return secure_filename(str(uuid.uuid4()) + os.path.splitext(original_filename)[1])
+
+def _upload_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='photo-upload')
+
+def _create_photo(filename, original_filename, data):
+    # 创建数据库记录，data 可以是表单或 JSON
+    photo = Photo(
+        filename=filename,
+        original_filename=original_filename,
+        file_path=get_storage().location(filename),
+        exif_data=data.get('exif_data'),
+        latitude=float(data.get('latitude')) if data.get('latitude') else None,
+        longitude=float(data.get('longitude')) if data.get('longitude') else None,
+        user_id=get_jwt_identity()
+    )
+    
+    db.session.add(photo)
+    record(photo.user_id, photo.created_at, photos=1)
+    record_place(photo.user_id, photo.latitude, photo.longitude)
+    db.session.commit()
+    
+    # 没有 GPS 信息的照片按拍摄时间匹配已有轨迹
+    if photo.latitude is None:
+        jobs.submit(photo.user_id, 'geotag', geotag_photos, photo.user_id, photo_ids=[photo.id])
+    
+    return photo
+
 @bp.route('/photos', methods=['GET'])
 @jwt_required()
 def get_photos():
@@ -39,30 +74,74 @@ def upload_photo():
         return jsonify({'error': '没有选择文件'}), 400
         
     try:
-        # 生成安全的文件名
-        filename = secure_filename(str(uuid.uuid4()) + os.path.splitext(file.filename)[1])
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        filename = _new_filename(file.filename)
         
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # 保存文件（gevent 模式下在线程池中执行，不阻塞其他连接）
+        storage = get_storage()
+        run_blocking(storage.save, file.stream, filename, file.mimetype)
+        saved = True
+        print(f"File saved to: {storage.location(filename)}")
         
-        # 保存文件
-        file.save(file_path)
-        print(f"File saved to: {file_path}")
+        photo = _create_photo(filename, file.filename, request.form)
         
-        # 创建数据库记录
-        photo = Photo(
-            filename=filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            exif_data=request.form.get('exif_data'),
-            latitude=float(request.form.get('latitude')) if request.form.get('latitude') else None,
-            longitude=float(request.form.get('longitude')) if request.form.get('longitude') else None,
-            user_id=get_jwt_identity()
-        )
+        return jsonify({
+            'id': photo.id,
+            'filename': filename,
+            'created_at': photo.created_at.isoformat()
+        }), 201
         
-        db.session.add(photo)
-        db.session.commit()
+    except Exception as e:
+        print(f"Upload error: {str(e)}")
+        if 'saved' in locals():
+            run_blocking(get_storage().delete, filename)
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/upload-url', methods=['POST'])
+@jwt_required()
+def upload_url():
+    # 预签名直传：客户端直接把文件上传到存储，然后调用 /confirm 创建记录
+    data = request.get_json(silent=True) or {}
+    if not data.get('filename'):
+        return jsonify({'error': '没有选择文件'}), 400
+    
+    filename = _new_filename(data['filename'])
+    presigned = get_storage().presigned_upload(filename, data.get('content_type') or 'image/jpeg')
+    if presigned is None:
+        return jsonify({'error': '当前存储不支持直传，请使用 /upload'}), 400
+    
+    token = _upload_serializer().dumps({'filename': filename, 'user_id': get_jwt_identity()})
+    return jsonify({
+        'url': presigned['url'],
+        'fields': presigned['fields'],
+        'upload_token': token
+    })
+
+@bp.route('/confirm', methods=['POST'])
+@jwt_required()
+def confirm_upload():
+    data = request.get_json(silent=True) or {}
+    try:
+        payload = _upload_serializer().loads(data.get('upload_token', ''),
+                                             max_age=current_app.config['S3_PRESIGN_EXPIRES'])
+    except BadSignature:
+        return jsonify({'error': '上传凭证无效或已过期'}), 400
+    if str(payload['user_id']) != str(get_jwt_identity()):
+        return jsonify({'error': '上传凭证无效或已过期'}), 400
+    
+    filename = payload['filename']
+    # 凭证在有效期内可以被重复提交，同一个存储文件只能对应一条照片记录
+    if Photo.query.filter_by(filename=filename).first():
+        return jsonify({'error': '该文件已确认'}), 409
+    
+    try:
+        if not run_blocking(get_storage().exists, filename):
+            return jsonify({'error': '文件尚未上传'}), 400
+        
+        # 由唯一约束保证只确认一次，并发提交时后到的请求在这里失败
+        db.session.add(ConfirmedUpload(filename=filename, user_id=get_jwt_identity()))
+        db.session.flush()
+        photo = _create_photo(filename, data.get('original_filename') or filename, data)
         
         return jsonify({
             'id': photo.id,
@@ -70,20 +149,33 @@ def upload_photo():
             'created_at': photo.created_at.isoformat()
         }), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': '该文件已确认'}), 409
     except Exception as e:
-        print(f"Upload error: {str(e)}")
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
+        print(f"Confirm error: {str(e)}")
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/geotag', methods=['POST'])
+@jwt_required()
+def geotag():
+    # 批量地理标记：所有没有坐标的照片，可通过 tz_offset（分钟）指定拍摄时区
+    data = request.get_json(silent=True) or {}
+    try:
+        tz_offset = int(data['tz_offset']) if data.get('tz_offset') is not None else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid tz_offset'}), 400
+    
+    user_id = get_jwt_identity()
+    job_id = jobs.submit(user_id, 'geotag', geotag_photos, user_id, tz_offset_minutes=tz_offset)
+    return jsonify({'job_id': job_id}), 202
+
 @bp.route('/image/<filename>')
 def serve_image(filename):
     try:
-        return send_file(
-            os.path.join(current_app.config['UPLOAD_FOLDER'], filename),
-            mimetype='image/jpeg'
-        )
+        # 文件名是 uuid，内容不会变化，允许客户端长期缓存
+        return send_stored(filename, mimetype='image/jpeg', max_age=86400)
     except Exception as e:
         print(f"Error serving image: {str(e)}")
         return jsonify({'error': str(e)}), 404
@@ -96,14 +188,15 @@ def delete_photo(photo_id):
         photo = Photo.query.filter_by(id=photo_id, user_id=user_id).first_or_404()
         
         # 删除实际的文件
-        if photo.file_path and os.path.exists(photo.file_path):
-            try:
-                os.remove(photo.file_path)
-            except OSError as e:
-                print(f"Error deleting file: {e}")
+        try:
+            run_blocking(get_storage().delete, photo.filename)
+        except Exception as e:
+            print(f"Error deleting file: {e}")
         
         # 从数据库中删除记录
         db.session.delete(photo)
+        record(user_id, photo.created_at, photos=-1)
+        record_place(user_id, photo.latitude, photo.longitude, -1)
         db.session.commit()
         
         return jsonify({'message': '照片已删除'}), 200
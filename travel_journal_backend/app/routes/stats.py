@@ -0,0 +1,63 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models.stats import UserRollup, PlaceRollup
+from app.utils.rollups import PLACE_CELL_DEGREES
+from datetime import datetime
+
+bp = Blueprint('stats', __name__, url_prefix='/api/stats')
+
+COUNTERS = ('journals', 'tracks', 'distance', 'photos', 'markers')
+
+def _period_start(day, period):
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+@bp.route('/timeline', methods=['GET'])
+@jwt_required()
+def timeline():
+    # 只读取预先汇总的行；按年统计由月数据相加得到
+    user_id = get_jwt_identity()
+    period = request.args.get('period', 'month')
+    if period not in ('day', 'month', 'year'):
+        return jsonify({'error': 'period must be day, month or year'}), 400
+    
+    # from/to 按所在的时间段取整，返回与日期范围有交集的完整时间段
+    query = UserRollup.query.filter_by(user_id=user_id, period='day' if period == 'day' else 'month')
+    try:
+        if request.args.get('from'):
+            start = _period_start(datetime.strptime(request.args['from'], '%Y-%m-%d').date(), period)
+            query = query.filter(UserRollup.period_start >= start)
+        if request.args.get('to'):
+            end = _period_start(datetime.strptime(request.args['to'], '%Y-%m-%d').date(), period)
+            if period == 'year':
+                end = end.replace(month=12)
+            query = query.filter(UserRollup.period_start <= end)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    rows = []
+    for rollup in query.order_by(UserRollup.period_start).all():
+        key = str(rollup.period_start.year) if period == 'year' else rollup.period_start.isoformat()
+        if not rows or rows[-1]['period_start'] != key:
+            rows.append(dict({'period_start': key}, **{name: 0 for name in COUNTERS}))
+        for name in COUNTERS:
+            rows[-1][name] += getattr(rollup, name)
+    
+    return jsonify({'period': period, 'rows': rows})
+
+@bp.route('/places', methods=['GET'])
+@jwt_required()
+def places():
+    user_id = get_jwt_identity()
+    limit = request.args.get('limit', 100, type=int)
+    rollups = PlaceRollup.query.filter(PlaceRollup.user_id == user_id, PlaceRollup.photos > 0) \
+        .order_by(PlaceRollup.photos.desc()).limit(limit).all()
+    
+    # 返回网格中心点坐标
+    return jsonify([{
+        'position': [(rollup.cell_lat + 0.5) * PLACE_CELL_DEGREES, (rollup.cell_lng + 0.5) * PLACE_CELL_DEGREES],
+        'photos': rollup.photos
+    } for rollup in rollups])
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.track import Track
-from app import db
+from app import db, jobs
+from app.utils.geotag import geotag_photos
+from app.utils.rollups import record
 from datetime import datetime
 
 bp = Blueprint('track', __name__, url_prefix='/api/track')
@@ -39,8 +41,13 @@ def create_track():
         )
         
         db.session.add(track)
+        record(track.user_id, track.start_time, tracks=1, distance=track.distance or 0)
         db.session.commit()
         
+        # 增量地理标记：只处理拍摄时间落在这条路线时间范围内的照片
+        jobs.submit(track.user_id, 'geotag', geotag_photos, track.user_id,
+                    start=track.start_time, end=track.end_time or track.start_time)
+        
         return jsonify({
             'id': track.id,
             'name': track.name,
@@ -62,6 +69,7 @@ def delete_track(track_id):
         track = Track.query.filter_by(id=track_id, user_id=user_id).first_or_404()
         
         db.session.delete(track)
+        record(user_id, track.start_time, tracks=-1, distance=-(track.distance or 0))
         db.session.commit()
         
         return jsonify({'message': '路线已删除'}), 200
@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import jobs
+from app.utils.geofile import IMPORTERS, EXPORTERS, import_file
+from app.utils.geotag import geotag_photos
+from app.utils.io_pool import run_blocking
+import os
+import tempfile
+
+bp = Blueprint('transfer', __name__, url_prefix='/api/transfer')
+
+def _import_and_geotag(user_id, path, fmt):
+    counts = import_file(user_id, path, fmt)
+    # 新导入的轨迹可能覆盖之前没有坐标的照片
+    if counts['tracks'] and not counts.get('duplicate'):
+        counts['geotag'] = geotag_photos(user_id)
+    return counts
+
+@bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_data():
+    if 'file' not in request.files:
+        return jsonify({'error': '没有文件'}), 400
+        
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': '没有选择文件'}), 400
+    
+    fmt = (request.form.get('format') or os.path.splitext(file.filename)[1].lstrip('.')).lower()
+    if fmt not in IMPORTERS:
+        return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+    
+    try:
+        # 先落盘，再由后台任务增量解析
+        fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+        os.close(fd)
+        run_blocking(file.save, path)
+        
+        job_id = jobs.submit(get_jwt_identity(), 'import', _import_and_geotag, get_jwt_identity(), path, fmt)
+        return jsonify({'job_id': job_id}), 202
+        
+    except Exception as e:
+        print(f"Import error: {str(e)}")
+        if 'path' in locals() and os.path.exists(path):
+            os.remove(path)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_data():
+    fmt = request.args.get('format', 'zip').lower()
+    if fmt not in EXPORTERS:
+        return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+    
+    # 边查询边输出，整个数据集不会一次性加载到内存
+    generator, mimetype = EXPORTERS[fmt]
+    return Response(
+        stream_with_context(generator(get_jwt_identity())),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=travel-journal.{fmt}'}
+    )
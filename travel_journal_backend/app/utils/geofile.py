@@ -0,0 +1,441 @@
+import hashlib
+import io
+import json
+import math
+import os
+import zipfile
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from xml.etree.ElementTree import ParseError, iterparse
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.import_log import ImportLog, ImportedItem
+from app.models.journal import Journal
+from app.models.marker import Marker
+from app.models.photo import Photo
+from app.models.track import Track
+from app.utils.jobs import JobError
+from app.utils.rollups import RollupDelta
+from app.utils.storage import get_storage
+
+IMPORT_BATCH_SIZE = 200
+EXPORT_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_time(text):
+    # ISO 8601 时间统一转换为不带时区的 UTC 时间，与数据库中的时间一致
+    if not text:
+        return None
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    value = datetime.fromisoformat(text)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def track_distance(points):
+    # 相邻点之间的球面距离之和，单位：米
+    distance = 0.0
+    for a, b in zip(points, points[1:]):
+        lat1, lat2 = math.radians(a['lat']), math.radians(b['lat'])
+        dlat = lat2 - lat1
+        dlng = math.radians(b['lng'] - a['lng'])
+        h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+        distance += 2 * 6371000 * math.asin(min(1.0, math.sqrt(h)))
+    return distance
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child_text(elem, name):
+    for child in elem:
+        if _local(child.tag) == name:
+            return (child.text or '').strip()
+    return None
+
+
+def _iterparse(stream, tags):
+    # 增量解析：每处理完一个目标元素就把它从父节点上摘掉，内存占用与文件大小无关
+    stack = []
+    for event, elem in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        name = _local(elem.tag)
+        if name in tags:
+            yield name, elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def _track(name, points):
+    times = [parse_time(p['timestamp']) for p in points if p.get('timestamp')]
+    return {
+        'name': name,
+        'points': points,
+        'start_time': times[0] if times else datetime.utcnow(),
+        'end_time': times[-1] if times else None,
+        'distance': track_distance(points)
+    }
+
+
+def _checked_time(text):
+    # 无法解析的时间返回 None，由调用方记为错误
+    try:
+        parse_time(text)
+        return text
+    except (ValueError, TypeError):
+        return None
+
+
+def iter_gpx(stream):
+    # 航点 -> 标记；轨迹（trk）和路线（rte）-> 路线记录
+    # 单个元素的坐标或时间无效时产出 ('error', 说明) 并继续解析
+    points = []
+    for name, elem in _iterparse(stream, {'wpt', 'trkpt', 'rtept', 'trk', 'rte'}):
+        if name == 'wpt':
+            try:
+                yield 'marker', {
+                    'latitude': float(elem.get('lat')),
+                    'longitude': float(elem.get('lon')),
+                    'description': (_child_text(elem, 'desc') or _child_text(elem, 'name') or '')[:200]
+                }
+            except (ValueError, TypeError):
+                yield 'error', f'无效的航点坐标: {elem.get("lat")}, {elem.get("lon")}'
+        elif name in ('trkpt', 'rtept'):
+            try:
+                point = {'lat': float(elem.get('lat')), 'lng': float(elem.get('lon')), 'timestamp': None}
+            except (ValueError, TypeError):
+                yield 'error', f'无效的轨迹点坐标: {elem.get("lat")}, {elem.get("lon")}'
+                continue
+            text = _child_text(elem, 'time')
+            if text:
+                point['timestamp'] = _checked_time(text)
+                if point['timestamp'] is None:
+                    yield 'error', f'无效的轨迹点时间: {text}'
+            points.append(point)
+        else:
+            if points:
+                yield 'track', _track(_child_text(elem, 'name'), points)
+            points = []
+
+
+def _kml_coordinates(text):
+    points = []
+    for item in (text or '').split():
+        values = item.split(',')
+        points.append({'lat': float(values[1]), 'lng': float(values[0]), 'timestamp': None})
+    return points
+
+
+def _kml_placemark(elem):
+    name = _child_text(elem, 'name')
+    description = _child_text(elem, 'description') or name or ''
+    items, whens, coords = [], [], []
+    for node in elem.iter():
+        tag = _local(node.tag)
+        if tag == 'Point':
+            point = _kml_coordinates(_child_text(node, 'coordinates'))
+            if point:
+                items.append(('marker', {
+                    'latitude': point[0]['lat'],
+                    'longitude': point[0]['lng'],
+                    'description': description[:200]
+                }))
+        elif tag == 'LineString':
+            points = _kml_coordinates(_child_text(node, 'coordinates'))
+            if points:
+                items.append(('track', _track(name, points)))
+        elif tag == 'when':
+            whens.append(_checked_time((node.text or '').strip()))
+        elif tag == 'coord':
+            values = (node.text or '').split()
+            coords.append({'lat': float(values[1]), 'lng': float(values[0]), 'timestamp': None})
+    if coords:
+        for point, when in zip(coords, whens):
+            point['timestamp'] = when
+        items.append(('track', _track(name, coords)))
+    return items
+
+
+def iter_kml(stream):
+    # Point -> 标记；LineString 和 gx:Track（带时间）-> 路线记录
+    # 一个 Placemark 的数据无效时整体跳过，产出 ('error', 说明) 并继续解析
+    for _, elem in _iterparse(stream, {'Placemark'}):
+        try:
+            items = _kml_placemark(elem)
+        except (ValueError, TypeError, IndexError):
+            items = [('error', f'无效的 Placemark: {_child_text(elem, "name") or ""}')]
+        yield from items
+
+
+IMPORTERS = {
+    'gpx': iter_gpx,
+    'kml': iter_kml
+}
+
+MAX_REPORTED_ERRORS = 20
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _import_counts(log, errors):
+    return {
+        'import_id': log.id,
+        'tracks': log.tracks,
+        'markers': log.markers,
+        'skipped': log.skipped,
+        'errors': errors
+    }
+
+
+def _claim_import(user_id, source_hash, fmt):
+    # 原子地占用同一文件的 ImportLog：返回 (log, 是否占用成功)
+    # 同一文件的另一个导入任务仍在运行（且没有超时）时不能再占用，否则两个任务会从同一位置重复写入
+    log = ImportLog.query.filter_by(user_id=user_id, source_hash=source_hash).first()
+    if log is None:
+        try:
+            with db.session.begin_nested():
+                log = ImportLog(user_id=user_id, source_hash=source_hash, format=fmt, status='running')
+                db.session.add(log)
+            db.session.commit()
+            return log, True
+        except IntegrityError:
+            # 并发提交的同一文件已经先插入
+            db.session.rollback()
+            log = ImportLog.query.filter_by(user_id=user_id, source_hash=source_hash).one()
+
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['IMPORT_STALE_SECONDS'])
+    result = db.session.execute(
+        db.update(ImportLog)
+        .where(ImportLog.id == log.id, ImportLog.status != 'done',
+               db.or_(ImportLog.status != 'running', ImportLog.updated_at < stale_before))
+        .values(status='running', error=None, updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return log, result.rowcount > 0
+
+
+def import_file(user_id, path, fmt):
+    # 后台任务：逐条解析并分批提交，返回导入数量
+    # 同一用户导入同一文件只有一条 ImportLog：已完成或正在导入的直接返回其状态，失败的从已提交的位置继续，不会重复写入
+    log = None
+    try:
+        log, claimed = _claim_import(user_id, _file_hash(path), fmt)
+        if not claimed:
+            return dict(_import_counts(log, []), status=log.status, duplicate=True)
+
+        errors = []
+        batch = []
+        rollup = RollupDelta(user_id)
+        resume_from = log.processed
+        position = 0
+
+        def flush_batch():
+            # 业务数据、来源记录、进度和统计汇总在同一个事务中提交，updated_at 同时作为任务的心跳
+            db.session.flush()
+            for kind, row in batch:
+                db.session.add(ImportedItem(import_id=log.id, kind=kind, row_id=row.id))
+            log.processed = position
+            log.updated_at = datetime.utcnow()
+            rollup.apply()
+            db.session.commit()
+            batch.clear()
+
+        try:
+            with open(path, 'rb') as stream:
+                for kind, values in IMPORTERS[fmt](stream):
+                    position += 1
+                    if position <= resume_from:
+                        continue
+                    if kind == 'error':
+                        log.skipped += 1
+                        if len(errors) < MAX_REPORTED_ERRORS:
+                            errors.append(values)
+                    elif kind == 'track':
+                        row = Track(user_id=user_id, **values)
+                        db.session.add(row)
+                        batch.append((kind, row))
+                        rollup.add(values['start_time'], tracks=1, distance=values['distance'])
+                        log.tracks += 1
+                    else:
+                        row = Marker(user_id=user_id, **values)
+                        db.session.add(row)
+                        batch.append((kind, row))
+                        rollup.add(None, markers=1)
+                        log.markers += 1
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        flush_batch()
+        except ParseError as e:
+            # 文件在中途损坏：已解析出的数据仍然有效，提交后把导入标记为失败
+            flush_batch()
+            log.status = 'failed'
+            log.error = f'文件解析失败: {str(e)}'
+            db.session.commit()
+            raise JobError(log.error, _import_counts(log, errors))
+
+        flush_batch()
+        log.status = 'done'
+        db.session.commit()
+        return _import_counts(log, errors)
+    except JobError:
+        raise
+    except Exception as e:
+        # 数据库等错误：回滚未提交的一批，返回已提交的数量，重试时从 processed 继续
+        # 只有本任务占用的导入才能标记为失败，不能改动其他任务正在进行的导入
+        db.session.rollback()
+        if log is None or not claimed:
+            raise
+        log.status = 'failed'
+        log.error = str(e)
+        db.session.commit()
+        raise JobError(str(e), _import_counts(log, []))
+    finally:
+        os.remove(path)
+
+
+def _iter_rows(model, user_id):
+    return model.query.filter_by(user_id=user_id).order_by(model.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def export_gpx(user_id):
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx version="1.1" creator="travel-journal" xmlns="http://www.topografix.com/GPX/1/1">\n')
+    for marker in _iter_rows(Marker, user_id):
+        yield (f'<wpt lat="{marker.latitude}" lon="{marker.longitude}">'
+               f'<desc>{escape(marker.description or "")}</desc></wpt>\n')
+    for track in _iter_rows(Track, user_id):
+        parts = [f'<trk><name>{escape(track.name or "")}</name><trkseg>']
+        for point in track.points or []:
+            time = f'<time>{escape(point["timestamp"])}</time>' if point.get('timestamp') else ''
+            parts.append(f'<trkpt lat="{point["lat"]}" lon="{point["lng"]}">{time}</trkpt>')
+        parts.append('</trkseg></trk>\n')
+        yield ''.join(parts)
+    yield '</gpx>\n'
+
+
+def export_geojson(user_id):
+    # 逐个输出 Feature，不在内存中拼装完整的 FeatureCollection
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = '\n'
+    for marker in _iter_rows(Marker, user_id):
+        yield separator + json.dumps({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [marker.longitude, marker.latitude]},
+            'properties': {'kind': 'marker', 'id': marker.id, 'description': marker.description}
+        }, ensure_ascii=False)
+        separator = ',\n'
+    for track in _iter_rows(Track, user_id):
+        points = track.points or []
+        yield separator + json.dumps({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': [[p['lng'], p['lat']] for p in points]},
+            'properties': {
+                'kind': 'track',
+                'id': track.id,
+                'name': track.name,
+                'start_time': track.start_time.isoformat(),
+                'end_time': track.end_time.isoformat() if track.end_time else None,
+                'distance': track.distance,
+                'coordTimes': [p.get('timestamp') for p in points]
+            }
+        }, ensure_ascii=False)
+        separator = ',\n'
+    for photo in _iter_rows(Photo, user_id):
+        if photo.latitude is None or photo.longitude is None:
+            continue
+        yield separator + json.dumps({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [photo.longitude, photo.latitude]},
+            'properties': {'kind': 'photo', 'id': photo.id, 'filename': photo.filename}
+        }, ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+def export_journals(user_id):
+    yield '['
+    separator = '\n'
+    for journal in _iter_rows(Journal, user_id):
+        yield separator + json.dumps({
+            'id': journal.id,
+            'title': journal.title,
+            'content': journal.content,
+            'created_at': journal.created_at.isoformat(),
+            'updated_at': journal.updated_at.isoformat()
+        }, ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+class _ZipStream(io.RawIOBase):
+    # 只能追加写入的缓冲区，zipfile 写入后由生成器取走数据，实现边压缩边发送
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_zip(user_id):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for name, generator in (('travel.gpx', export_gpx), ('travel.geojson', export_geojson),
+                                ('journals.json', export_journals)):
+            info = zipfile.ZipInfo(name, datetime.utcnow().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in generator(user_id):
+                    entry.write(chunk.encode('utf-8'))
+                    yield stream.drain()
+
+        storage = get_storage()
+        for photo in _iter_rows(Photo, user_id):
+            try:
+                source = storage.open(photo.filename)
+            except FileNotFoundError:
+                continue
+            info = zipfile.ZipInfo(f'photos/{photo.filename}', photo.created_at.timetuple()[:6])
+            with closing(source), archive.open(info, 'w', force_zip64=True) as entry:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield stream.drain()
+    yield stream.drain()
+
+
+EXPORTERS = {
+    'gpx': (export_gpx, 'application/gpx+xml'),
+    'geojson': (export_geojson, 'application/geo+json'),
+    'zip': (export_zip, 'application/zip')
+}
@@ -0,0 +1,190 @@
+import json
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.photo import Photo
+from app.models.track import Track
+from app.models.user import User
+from app.utils.rollups import RollupDelta
+
+EPOCH = datetime(1970, 1, 1)
+COMMIT_BATCH_SIZE = 500
+
+
+def capture_time(photo, tz_offset_minutes=None):
+    # 拍摄时间来自前端提取的 EXIF（本地时间，格式 2024:11:10 12:00:00），换算为 UTC 秒数
+    # 本地时间需要知道拍摄地时区：优先使用 EXIF 中的 OffsetTimeOriginal，其次是 tz_offset；都没有时返回 None
+    exif = photo.exif_data
+    if isinstance(exif, str):
+        try:
+            exif = json.loads(exif)
+        except ValueError:
+            return None
+    if not isinstance(exif, dict):
+        return None
+
+    text = exif.get('dateTime') or exif.get('DateTimeOriginal') or exif.get('DateTime')
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        value = datetime.strptime(text, '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        try:
+            value = datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        offset = exif.get('offsetTimeOriginal') or exif.get('OffsetTimeOriginal') or exif.get('OffsetTime')
+        try:
+            value = value.replace(tzinfo=datetime.strptime(offset.strip(), '%z').tzinfo)
+        except (ValueError, TypeError, AttributeError):
+            pass
+    # 自带时区的时间已经是确定的时刻，只有本地时间才需要按 tz_offset 换算
+    if value.tzinfo is not None:
+        return value.timestamp()
+    if tz_offset_minutes is None:
+        return None
+    value -= timedelta(minutes=tz_offset_minutes)
+    return (value - EPOCH).total_seconds()
+
+
+def user_tz_offset(user_id):
+    # 用户在个人设置 preferences.tz_offset 中保存的时区（相对 UTC 的分钟数），没有设置时使用部署配置
+    user = db.session.get(User, user_id)
+    preferences = user.preferences if user is not None else None
+    if isinstance(preferences, dict) and preferences.get('tz_offset') is not None:
+        try:
+            return int(preferences['tz_offset'])
+        except (ValueError, TypeError):
+            pass
+    return current_app.config['GEOTAG_TZ_OFFSET_MINUTES']
+
+
+def _epoch_seconds(text):
+    # 轨迹点时间的快速解析，建索引时每个点都要调用一次
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    value = datetime.fromisoformat(text)
+    if value.tzinfo is None:
+        return (value - EPOCH).total_seconds()
+    return value.timestamp()
+
+
+class TrackIndex:
+    # 按时间排序的轨迹点索引，列式存储在 array 中，查询为一次二分查找
+
+    def __init__(self, rows):
+        points = []
+        for track_id, track_points in rows:
+            for point in track_points or []:
+                if not point.get('timestamp'):
+                    continue
+                try:
+                    t = _epoch_seconds(point['timestamp'])
+                except (ValueError, TypeError, AttributeError):
+                    continue
+                points.append((t, point['lat'], point['lng'], track_id))
+        points.sort()
+        self.times = array('d', (p[0] for p in points))
+        self.lats = array('d', (p[1] for p in points))
+        self.lngs = array('d', (p[2] for p in points))
+        self.tracks = array('q', (p[3] for p in points))
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, t, max_gap):
+        # 同一条轨迹内的相邻两点做线性插值；跨轨迹或超出时间间隔时取最近的点
+        times = self.times
+        i = bisect_left(times, t)
+        if i < len(times) and times[i] == t:
+            return self.lats[i], self.lngs[i]
+        before = i - 1 if i > 0 else None
+        after = i if i < len(times) else None
+
+        if before is not None and after is not None and self.tracks[before] == self.tracks[after] \
+                and times[after] - times[before] <= max_gap:
+            ratio = (t - times[before]) / (times[after] - times[before])
+            return (self.lats[before] + (self.lats[after] - self.lats[before]) * ratio,
+                    self.lngs[before] + (self.lngs[after] - self.lngs[before]) * ratio)
+
+        candidates = [j for j in (before, after) if j is not None and abs(times[j] - t) <= max_gap]
+        if not candidates:
+            return None
+        nearest = min(candidates, key=lambda j: abs(times[j] - t))
+        return self.lats[nearest], self.lngs[nearest]
+
+
+def geotag_photos(user_id, photo_ids=None, start=None, end=None, tz_offset_minutes=None):
+    # 为没有坐标的照片按拍摄时间匹配轨迹，可限定照片范围或时间窗口（增量模式）
+    # 时区未知时只处理 EXIF 自带时区的照片，不把本地时间当作 UTC，否则会匹配到相差数小时的轨迹点
+    if tz_offset_minutes is None:
+        tz_offset_minutes = user_tz_offset(user_id)
+    max_gap = current_app.config['GEOTAG_MAX_GAP_SECONDS']
+
+    query = db.session.query(Photo.id, Photo.exif_data).filter(
+        Photo.user_id == user_id,
+        Photo.latitude.is_(None)
+    )
+    if photo_ids:
+        query = query.filter(Photo.id.in_(photo_ids))
+
+    window_start = (start - EPOCH).total_seconds() - max_gap if start else None
+    window_end = (end - EPOCH).total_seconds() + max_gap if end else None
+    photos = []
+    for row in query.all():
+        t = capture_time(row, tz_offset_minutes)
+        if t is None:
+            continue
+        if (window_start is not None and t < window_start) or (window_end is not None and t > window_end):
+            continue
+        photos.append((t, row.id))
+    if not photos:
+        return {'checked': 0, 'tagged': 0}
+
+    # 只加载时间上可能覆盖这些照片的轨迹
+    photos.sort()
+    first = EPOCH + timedelta(seconds=photos[0][0] - max_gap)
+    last = EPOCH + timedelta(seconds=photos[-1][0] + max_gap)
+    rows = db.session.query(Track.id, Track.points).filter(
+        Track.user_id == user_id,
+        Track.start_time <= last,
+        db.or_(Track.end_time.is_(None), Track.end_time >= first)
+    ).all()
+    index = TrackIndex(rows)
+
+    updates = []
+    if len(index):
+        for t, photo_id in photos:
+            location = index.locate(t, max_gap)
+            if location is not None:
+                updates.append({'id': photo_id, 'latitude': location[0], 'longitude': location[1]})
+
+    # 只更新仍然没有坐标的照片：快照之后可能有其他任务或请求已经写入了坐标
+    tagged = 0
+    try:
+        for i in range(0, len(updates), COMMIT_BATCH_SIZE):
+            rollup = RollupDelta(user_id)
+            for item in updates[i:i + COMMIT_BATCH_SIZE]:
+                result = db.session.execute(
+                    db.update(Photo)
+                    .where(Photo.id == item['id'], Photo.latitude.is_(None))
+                    .values(latitude=item['latitude'], longitude=item['longitude']),
+                    execution_options={'synchronize_session': False}
+                )
+                # 并发的地理标记任务可能已经处理过这张照片，只统计本次实际写入的行
+                if result.rowcount:
+                    tagged += 1
+                    rollup.add_place(item['latitude'], item['longitude'])
+            rollup.apply()
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {'checked': len(photos), 'tagged': tagged}
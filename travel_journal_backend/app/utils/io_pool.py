@@ -0,0 +1,35 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _cooperative():
+    # 只有 serve.py 打过补丁时 gevent 才会被导入，run.py 启动时不付出导入开销
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def _hub():
+    from gevent import get_hub
+    return get_hub()
+
+
+def init_pool(size):
+    # 在 gevent 下，磁盘读写等阻塞调用交给有上限的原生线程池执行
+    if _cooperative():
+        _hub().threadpool.maxsize = size
+
+
+def create_executor(max_workers, thread_name_prefix):
+    # 打过补丁后标准库线程池里的“线程”其实是 greenlet，CPU 密集的任务会卡住整个 hub；
+    # 这时改用 gevent 提供的执行器，任务在真正的系统线程中运行
+    if _cooperative():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+
+def run_blocking(func, *args, **kwargs):
+    # gevent 模式下只挂起当前 greenlet；同步 worker 下直接调用，没有额外开销
+    if _cooperative():
+        return _hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
@@ -0,0 +1,76 @@
+import threading
+import time
+import uuid
+
+from app.utils.io_pool import create_executor
+
+
+class JobError(Exception):
+    # 任务失败但已经完成了一部分工作，result 会记录在任务状态中
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobRunner:
+    # 后台任务：固定大小的线程池 + 内存中的任务状态，任务在应用上下文中执行
+
+    def __init__(self):
+        self._app = None
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.retention = 3600
+
+    def init_app(self, app):
+        self._app = app
+        self._executor = create_executor(app.config['JOB_WORKERS'], 'job')
+        self.retention = app.config['JOB_RETENTION']
+
+    def submit(self, user_id, kind, func, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        self._prune()
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'kind': kind,
+                'user_id': user_id,
+                'status': 'pending',
+                'result': None,
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None
+            }
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id, user_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or str(job['user_id']) != str(user_id):
+                return None
+            return dict(job)
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status='running')
+        with self._app.app_context():
+            try:
+                result = func(*args, **kwargs)
+                self._update(job_id, status='done', result=result, finished_at=time.time())
+            except Exception as e:
+                print(f"Job {job_id} error: {str(e)}")
+                self._update(job_id, status='failed', error=str(e), result=getattr(e, 'result', None),
+                             finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _prune(self):
+        # 已结束的任务只保留一段时间
+        deadline = time.time() - self.retention
+        with self._lock:
+            for job_id in [k for k, job in self._jobs.items()
+                           if job['finished_at'] and job['finished_at'] < deadline]:
+                del self._jobs[job_id]
@@ -0,0 +1,131 @@
+import importlib
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.journal import Journal
+from app.models.marker import Marker
+from app.models.photo import Photo
+from app.models.stats import UserRollup, PlaceRollup
+from app.models.track import Track
+
+PLACE_CELL_DEGREES = 0.1
+REBUILD_BATCH_SIZE = 1000
+# 支持 INSERT ... ON CONFLICT 的方言，模块在第一次写入汇总时才导入，不影响冷启动
+UPSERT_DIALECTS = {
+    'sqlite': 'sqlalchemy.dialects.sqlite',
+    'postgresql': 'sqlalchemy.dialects.postgresql'
+}
+
+
+def place_cell(latitude, longitude):
+    return math.floor(latitude / PLACE_CELL_DEGREES), math.floor(longitude / PLACE_CELL_DEGREES)
+
+
+class RollupDelta:
+    # 在内存中累积一批变化，apply() 时每个键只执行一条 upsert
+    # 与业务数据在同一个事务中提交
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.periods = defaultdict(Counter)
+        self.places = Counter()
+
+    def add(self, when, **deltas):
+        day = (when or datetime.utcnow()).date()
+        for key in (('day', day), ('month', day.replace(day=1))):
+            self.periods[key].update(deltas)
+
+    def add_place(self, latitude, longitude, delta=1):
+        if latitude is not None and longitude is not None:
+            self.places[place_cell(latitude, longitude)] += delta
+
+    def apply(self):
+        for (period, period_start), deltas in self.periods.items():
+            _bump(UserRollup, {'user_id': self.user_id, 'period': period, 'period_start': period_start}, deltas)
+        for (cell_lat, cell_lng), delta in self.places.items():
+            _bump(PlaceRollup, {'user_id': self.user_id, 'cell_lat': cell_lat, 'cell_lng': cell_lng},
+                  {'photos': delta})
+        self.periods.clear()
+        self.places.clear()
+
+
+def _bump(model, keys, deltas):
+    # 汇总行的"不存在则插入"必须是原子的：并发的请求/任务可能同时第一次写入同一个键
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect in UPSERT_DIALECTS:
+        statement = importlib.import_module(UPSERT_DIALECTS[dialect]).insert(model).values(**keys, **deltas)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={k: getattr(model, k) + v for k, v in deltas.items()}
+        ))
+        return
+
+    # 其他数据库：插入放在 SAVEPOINT 中，唯一约束冲突时回滚到保存点并改为 UPDATE
+    if _update_rollup(model, keys, deltas):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(model).values(**keys, **deltas))
+    except IntegrityError:
+        _update_rollup(model, keys, deltas)
+
+
+def _update_rollup(model, keys, deltas):
+    result = db.session.execute(
+        db.update(model).filter_by(**keys).values({k: getattr(model, k) + v for k, v in deltas.items()}),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount > 0
+
+
+def record(user_id, when, **deltas):
+    delta = RollupDelta(user_id)
+    delta.add(when, **deltas)
+    delta.apply()
+
+
+def record_place(user_id, latitude, longitude, delta=1):
+    rollup = RollupDelta(user_id)
+    rollup.add_place(latitude, longitude, delta)
+    rollup.apply()
+
+
+def delete_user_rollups(user_id):
+    UserRollup.query.filter_by(user_id=user_id).delete()
+    PlaceRollup.query.filter_by(user_id=user_id).delete()
+
+
+def rebuild():
+    # 根据业务表重新计算全部汇总（首次上线或数据修复时使用）
+    UserRollup.query.delete()
+    PlaceRollup.query.delete()
+    deltas = {}
+
+    def delta_for(user_id):
+        if user_id not in deltas:
+            deltas[user_id] = RollupDelta(user_id)
+        return deltas[user_id]
+
+    for row in db.session.query(Journal.user_id, Journal.created_at).yield_per(REBUILD_BATCH_SIZE):
+        delta_for(row.user_id).add(row.created_at, journals=1)
+    for row in db.session.query(Track.user_id, Track.start_time, Track.distance).yield_per(REBUILD_BATCH_SIZE):
+        delta_for(row.user_id).add(row.start_time, tracks=1, distance=row.distance or 0)
+    for row in db.session.query(Marker.user_id, Marker.created_at).yield_per(REBUILD_BATCH_SIZE):
+        delta_for(row.user_id).add(row.created_at, markers=1)
+    for row in db.session.query(Photo.user_id, Photo.created_at, Photo.latitude,
+                                Photo.longitude).yield_per(REBUILD_BATCH_SIZE):
+        delta = delta_for(row.user_id)
+        delta.add(row.created_at, photos=1)
+        delta.add_place(row.latitude, row.longitude)
+
+    for delta in deltas.values():
+        delta.apply()
+    db.session.commit()
+    return len(deltas)
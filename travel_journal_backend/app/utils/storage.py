@@ -0,0 +1,225 @@
+import os
+import shutil
+import threading
+import uuid
+
+from flask import abort, current_app, redirect, send_file
+
+from app.utils.io_pool import run_blocking
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalStorage:
+    # 本地目录存储，单节点部署使用
+
+    def __init__(self, app):
+        self.root = app.config['UPLOAD_FOLDER']
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise FileNotFoundError(key)
+        return path
+
+    def location(self, key):
+        return self._path(key)
+
+    def save(self, fileobj, key, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as target:
+            shutil.copyfileobj(fileobj, target, CHUNK_SIZE)
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def local_path(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(key)
+        return path
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def presigned_upload(self, key, content_type):
+        return None
+
+    def presigned_download(self, key):
+        return None
+
+
+class S3Storage:
+    # S3 兼容存储（AWS S3、MinIO 等），多节点共享照片
+    # 大文件分片并行上传/下载，支持预签名 URL 让客户端直接读写存储，读取时带本地缓存
+
+    def __init__(self, app):
+        self.bucket = app.config['S3_BUCKET']
+        self.endpoint_url = app.config['S3_ENDPOINT_URL']
+        self.region = app.config['S3_REGION']
+        self.access_key = app.config['S3_ACCESS_KEY_ID']
+        self.secret_key = app.config['S3_SECRET_ACCESS_KEY']
+        self.multipart_threshold = app.config['S3_MULTIPART_THRESHOLD']
+        self.max_concurrency = app.config['S3_MAX_CONCURRENCY']
+        self.presign_expires = app.config['S3_PRESIGN_EXPIRES']
+        self.presign_downloads = app.config['S3_PRESIGN_DOWNLOADS']
+        self.max_content_length = app.config['MAX_CONTENT_LENGTH']
+        self.cache_folder = app.config['STORAGE_CACHE_FOLDER']
+        self.cache_max_bytes = app.config['STORAGE_CACHE_MAX_BYTES']
+        self._client = None
+        self._transfer_config = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 在第一次访问存储时才导入，不影响冷启动
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from boto3.s3.transfer import TransferConfig
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=self.multipart_threshold,
+                        multipart_chunksize=self.multipart_threshold,
+                        max_concurrency=self.max_concurrency
+                    )
+                    self._client = boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key
+                    )
+        return self._client
+
+    def location(self, key):
+        return f's3://{self.bucket}/{key}'
+
+    def save(self, fileobj, key, content_type=None):
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra_args, Config=self._transfer_config)
+        self._drop_cached(key)
+
+    def open(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+
+    def local_path(self, key):
+        # 本地读缓存：未命中时下载到缓存目录，超出容量时淘汰最久未访问的文件
+        path = self._cache_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        if not self.exists(key):
+            raise FileNotFoundError(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.part'
+        try:
+            self.client.download_file(self.bucket, key, temp_path, Config=self._transfer_config)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._evict()
+        return path
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        self._drop_cached(key)
+
+    def presigned_upload(self, key, content_type):
+        return self.client.generate_presigned_post(
+            self.bucket,
+            key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, self.max_content_length]
+            ],
+            ExpiresIn=self.presign_expires
+        )
+
+    def presigned_download(self, key):
+        if not self.presign_downloads:
+            return None
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=self.presign_expires
+        )
+
+    def _cache_path(self, key):
+        path = os.path.abspath(os.path.join(self.cache_folder, key))
+        if not path.startswith(os.path.abspath(self.cache_folder) + os.sep):
+            raise FileNotFoundError(key)
+        return path
+
+    def _drop_cached(self, key):
+        path = self._cache_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _evict(self):
+        entries = []
+        for directory, _, filenames in os.walk(self.cache_folder):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+BACKENDS = {
+    'local': LocalStorage,
+    's3': S3Storage
+}
+
+
+def init_storage(app):
+    app.extensions['storage'] = BACKENDS[app.config['STORAGE_BACKEND']](app)
+
+
+def get_storage():
+    return current_app.extensions['storage']
+
+
+def send_stored(key, mimetype=None, max_age=None):
+    # 支持预签名时重定向到存储直接下载，应用进程不再转发图片数据
+    storage = get_storage()
+    url = storage.presigned_download(key)
+    if url:
+        return redirect(url)
+    try:
+        path = run_blocking(storage.local_path, key)
+    except FileNotFoundError:
+        abort(404)
+    return send_file(path, mimetype=mimetype, max_age=max_age)
@@ -0,0 +1,107 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+
+class RevocationStore:
+    # 已吊销的令牌（按 jti）和已注销的账户（按用户 id），检查都是 O(1)
+    # 配置 REVOCATION_REDIS_URL 后同时写入 Redis，多节点共享吊销状态
+
+    def __init__(self):
+        self._tokens = {}  # jti -> 过期时间戳
+        self._expiry = []  # (过期时间戳, jti) 小顶堆，按过期顺序惰性清理
+        self._users = {}  # user_id -> 吊销时间戳
+        self._lock = threading.Lock()
+        self._redis = None
+        self._user_ttl = None
+
+    def init_app(self, app):
+        self._user_ttl = int(app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds())
+        url = app.config.get('REVOCATION_REDIS_URL')
+        if url:
+            import redis
+            self._redis = redis.Redis.from_url(url)
+
+    def revoke_token(self, jti, expires_at):
+        now = time.time()
+        with self._lock:
+            self._remember(jti, expires_at, now)
+        if self._redis is not None:
+            self._redis.set(f'revoked:jti:{jti}', 1, ex=max(int(expires_at - now), 1))
+
+    def _remember(self, jti, expires_at, now):
+        # 调用方持有锁；只弹出堆顶已经过期的条目，内存占用只和有效期内的吊销数量有关
+        self._tokens[jti] = expires_at
+        heapq.heappush(self._expiry, (expires_at, jti))
+        while self._expiry and self._expiry[0][0] < now:
+            exp, key = heapq.heappop(self._expiry)
+            if self._tokens.get(key) == exp:
+                del self._tokens[key]
+
+    def revoke_user(self, user_id):
+        # 该用户在此之前签发的所有令牌都失效（用于注销账户）
+        now = time.time()
+        with self._lock:
+            self._users[str(user_id)] = now
+        if self._redis is not None:
+            self._redis.set(f'revoked:user:{user_id}', now, ex=self._user_ttl)
+
+    def is_revoked(self, payload):
+        jti = payload['jti']
+        user_id = str(payload['sub'])
+        if jti in self._tokens:
+            return True
+        revoked_at = self._users.get(user_id)
+        if revoked_at is not None and payload['iat'] <= revoked_at:
+            return True
+        if self._redis is None:
+            return False
+
+        token_hit, user_revoked_at = self._redis.mget(f'revoked:jti:{jti}', f'revoked:user:{user_id}')
+        if token_hit is not None:
+            with self._lock:
+                self._remember(jti, payload['exp'], time.time())
+            return True
+        if user_revoked_at is not None and payload['iat'] <= float(user_revoked_at):
+            with self._lock:
+                self._users[user_id] = float(user_revoked_at)
+            return True
+        return False
+
+
+class IdentityCache:
+    # 有容量上限和过期时间的用户资料缓存，认证请求读取身份信息时不必访问数据库
+
+    def __init__(self, max_size=10000, ttl=300):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def init_app(self, app):
+        self.max_size = app.config['IDENTITY_CACHE_SIZE']
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._items.get(str(user_id))
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[str(user_id)]
+                return None
+            self._items.move_to_end(str(user_id))
+            return value
+
+    def set(self, user_id, value):
+        with self._lock:
+            self._items[str(user_id)] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(str(user_id))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._items.pop(str(user_id), None)
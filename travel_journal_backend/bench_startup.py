@@ -0,0 +1,60 @@
+# 冷启动基准：每轮在新的解释器进程中测量 导入 -> create_app -> 第一个请求 的耗时
+# 同时测量旧的启动方式作为对照（启动时执行 makedirs 和 db.create_all()，即原来的 run.py）
+# 用法：python bench_startup.py [轮数]
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = '''
+import os, sys, time
+t0 = time.perf_counter()
+from app import create_app, db
+app = create_app()
+if {baseline}:
+    with app.app_context():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        if not os.path.exists(upload_folder):
+            os.makedirs(upload_folder, mode=0o755)
+        db.create_all()
+t1 = time.perf_counter()
+response = app.test_client().get('/api/auth/health')
+t2 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(t1 - t0, t2 - t0, int('PIL' in sys.modules))
+'''
+
+MODES = (
+    ('启动时建表（旧）', True),
+    ('init-db 单独执行', False)
+)
+
+
+def run_once(baseline, env):
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(baseline=baseline)], text=True, env=env)
+    factory, first_request, pil_loaded = output.split()
+    return float(factory), float(first_request), pil_loaded == '1'
+
+
+def main(rounds):
+    # 使用临时数据库，对照组的 create_all() 不会改动开发数据库
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{tempfile.mkdtemp()}/bench.db')
+    print(f'轮数: {rounds}')
+    # 两种方式交替运行，减少机器负载变化对对比的影响
+    results_by_mode = {baseline: [] for _, baseline in MODES}
+    for _ in range(rounds):
+        for _, baseline in MODES:
+            results_by_mode[baseline].append(run_once(baseline, env))
+    for name, baseline in MODES:
+        results = results_by_mode[baseline]
+        factory = [r[0] * 1000 for r in results]
+        first_request = [r[1] * 1000 for r in results]
+        print(f'\n[{name}]')
+        print(f'create_app:      中位数 {statistics.median(factory):.1f} ms, 最小 {min(factory):.1f} ms')
+        print(f'首个请求完成:    中位数 {statistics.median(first_request):.1f} ms, 最小 {min(first_request):.1f} ms')
+        print(f'启动时加载 PIL:  {"是" if any(r[2] for r in results) else "否"}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
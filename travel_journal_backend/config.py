@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev'
@@ -6,9 +7,45 @@ class Config:
         'sqlite:///travel_journal.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
+    # 短期访问令牌 + 长期刷新令牌，访问令牌过期后通过 /api/auth/refresh 换新
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES') or 15))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS') or 30))
+    # 可选：多节点共享令牌吊销列表
+    REVOCATION_REDIS_URL = os.environ.get('REVOCATION_REDIS_URL')
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE') or 10000)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 300)
     CORS_HEADERS = 'Content-Type'
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER, mode=0o755, exist_ok=True) 
\ No newline at end of file
+    # 轨迹文件导入（多年的 GPX/KML 历史记录）单独使用更大的上传上限
+    IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH') or 2 * 1024 * 1024 * 1024)
+    # 照片存储：local（UPLOAD_FOLDER）或 s3（S3 兼容存储，如 AWS S3、MinIO）
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'local'
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY') or 8)
+    S3_PRESIGN_EXPIRES = 3600
+    S3_PRESIGN_DOWNLOADS = (os.environ.get('S3_PRESIGN_DOWNLOADS') or 'true').lower() == 'true'
+    STORAGE_CACHE_FOLDER = os.environ.get('STORAGE_CACHE_FOLDER') or os.path.join(BASE_DIR, 'cache')
+    STORAGE_CACHE_MAX_BYTES = int(os.environ.get('STORAGE_CACHE_MAX_BYTES') or 1024 * 1024 * 1024)
+    # 生产服务模式（serve.py）
+    SERVER_HOST = os.environ.get('SERVER_HOST') or '0.0.0.0'
+    SERVER_PORT = int(os.environ.get('SERVER_PORT') or 5000)
+    SERVER_MAX_CONNECTIONS = int(os.environ.get('SERVER_MAX_CONNECTIONS') or 5000)
+    IO_THREADPOOL_SIZE = int(os.environ.get('IO_THREADPOOL_SIZE') or 16)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    # 后台任务（导入、地理标记等）
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_RETENTION = 3600
+    # 导入任务超过这个时间没有提交进度，视为进程已退出，同一文件可以重新导入
+    IMPORT_STALE_SECONDS = int(os.environ.get('IMPORT_STALE_SECONDS') or 600)
+    # 照片按拍摄时间匹配轨迹：允许的最大时间差，以及 EXIF 本地时间相对 UTC 的默认偏移
+    # 默认不设置：用户没有在 preferences.tz_offset 中设置时区时，不匹配只有本地时间的照片
+    GEOTAG_MAX_GAP_SECONDS = int(os.environ.get('GEOTAG_MAX_GAP_SECONDS') or 600)
+    GEOTAG_TZ_OFFSET_MINUTES = int(os.environ['GEOTAG_TZ_OFFSET_MINUTES']) \
+        if os.environ.get('GEOTAG_TZ_OFFSET_MINUTES') else None
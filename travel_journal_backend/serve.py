@@ -0,0 +1,48 @@
+# 生产环境入口：gevent 协程服务器，单节点可同时挂起大量慢速移动端连接
+# 用法：python serve.py（开发调试仍使用 run.py，首次部署前先运行 flask --app run init-db）
+from gevent import monkey
+monkey.patch_all()
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from sqlalchemy.engine import make_url
+
+from app import create_app
+from app.utils.io_pool import init_pool
+from config import Config
+
+
+class ServeConfig(Config):
+    # 数据库连接池有上限，超出的请求在协程中排队等待，而不是无限制地打开连接
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': 0,
+        'pool_timeout': 30,
+    }
+
+
+# 纯 Python 或通过 select 等待的驱动会被 monkey.patch_all() 变成协作式，查询时只挂起当前协程
+COOPERATIVE_DRIVERS = ('pymysql', 'psycopg')
+
+
+def check_database_driver(uri):
+    # sqlite3、psycopg2、mysqlclient 等 C 驱动不受补丁影响，每次查询都会阻塞整个 hub 上的所有连接
+    driver = make_url(uri).get_driver_name()
+    if driver not in COOPERATIVE_DRIVERS:
+        print(f"警告: 数据库驱动 {driver} 不是协作式的，查询期间所有连接都会被阻塞；"
+              f"生产环境请使用 mysql+pymysql:// 或 postgresql+psycopg://")
+
+
+app = create_app(ServeConfig)
+init_pool(app.config['IO_THREADPOOL_SIZE'])
+check_database_driver(app.config['SQLALCHEMY_DATABASE_URI'])
+
+if __name__ == '__main__':
+    server = WSGIServer(
+        (app.config['SERVER_HOST'], app.config['SERVER_PORT']),
+        app,
+        spawn=Pool(app.config['SERVER_MAX_CONNECTIONS'])
+    )
+    print(f"Serving on {app.config['SERVER_HOST']}:{app.config['SERVER_PORT']}")
+    server.serve_forever()
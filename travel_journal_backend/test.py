@@ -26,6 +26,17 @@ class TravelJournalTest:
             time.sleep(1)
         return False
 
+    def wait_for_job(self, job_id, timeout=60):
+        # 轮询后台任务直到结束，返回任务状态
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            response = requests.get(f'{BASE_URL}/jobs/{job_id}', headers=self.headers)
+            job = response.json()
+            if job.get('status') in ('done', 'failed'):
+                return job
+            time.sleep(0.5)
+        return None
+
     def test_auth(self):
         print("\n=== 测试用户认证 ===")
         try:
@@ -269,6 +280,128 @@ class TravelJournalTest:
                                  headers=self.headers)
         print('删除路径结果:', response.json())
 
+    def test_import(self):
+        print("\n=== 测试轨迹文件导入 ===")
+        # 每次运行生成内容不同的文件，避免与上一次运行的导入记录重复
+        tag = f'import-{time.time()}'
+        waypoints = ''.join(f'<wpt lat="{31 + i / 1000}" lon="121"><desc>{tag}</desc></wpt>' for i in range(50))
+        gpx = (f'<gpx><wpt lat="abc" lon="121"><desc>{tag}</desc></wpt>{waypoints}'
+               f'<trk><name>{tag}</name><trkseg>'
+               f'<trkpt lat="31" lon="121"><time>2019-01-01T00:00:00Z</time></trkpt>'
+               f'<trkpt lat="31.01" lon="121.01"><time>2019-01-01T00:10:00Z</time></trkpt>'
+               f'</trkseg></trk></gpx>').encode()
+
+        def submit():
+            files = {'file': ('history.gpx', gpx, 'application/gpx+xml')}
+            response = requests.post(f'{BASE_URL}/transfer/import', headers=self.headers, files=files)
+            return response.json().get('job_id')
+
+        # 连续提交两次同一个文件（模拟双击或重试），只能导入一次
+        jobs = [self.wait_for_job(job_id) for job_id in [submit(), submit()]]
+        print('两次导入结果:', [job and job['result'] for job in jobs])
+        if any(job is None or job['status'] != 'done' for job in jobs):
+            print('导入失败:', jobs)
+            return False
+        results = [job['result'] for job in jobs]
+        imported = [r for r in results if not r.get('duplicate')]
+        if len(imported) != 1 or imported[0]['markers'] != 50 or imported[0]['tracks'] != 1 \
+                or imported[0]['skipped'] != 1:
+            print('导入数量不正确:', results)
+            return False
+
+        # 导入完成后再次提交同一个文件不会产生新数据
+        job = self.wait_for_job(submit())
+        print('重复导入结果:', job and job['result'])
+        if job is None or not job['result'].get('duplicate'):
+            print('重复导入没有被识别')
+            return False
+
+        markers = [m for m in requests.get(f'{BASE_URL}/map/markers', headers=self.headers).json()
+                   if m.get('description') == tag]
+        tracks = [t for t in requests.get(f'{BASE_URL}/track/', headers=self.headers).json()
+                  if t.get('name') == tag]
+        print(f'数据库中的标记: {len(markers)}, 路线: {len(tracks)}')
+        ok = len(markers) == 50 and len(tracks) == 1
+
+        # 清理导入的数据
+        for marker in markers:
+            requests.delete(f'{BASE_URL}/map/markers/{marker["id"]}', headers=self.headers)
+        for track in tracks:
+            requests.delete(f'{BASE_URL}/track/{track["id"]}', headers=self.headers)
+        return ok
+
+    def test_geotag(self):
+        print("\n=== 测试照片地理标记 ===")
+        # 轨迹时间是 UTC，照片 EXIF 是东八区本地时间，12:05 正好在两个轨迹点（04:00Z、04:10Z）中间
+        preferences = requests.get(f'{BASE_URL}/auth/profile', headers=self.headers).json().get('preferences')
+        requests.put(f'{BASE_URL}/auth/profile', headers=self.headers,
+                     json={'preferences': dict(preferences or {}, tz_offset=480)})
+        track_data = {
+            'name': '地理标记测试路线',
+            'points': [
+                {'lat': 30.0, 'lng': 120.0, 'timestamp': '2020-06-01T04:00:00Z'},
+                {'lat': 30.1, 'lng': 120.2, 'timestamp': '2020-06-01T04:10:00Z'}
+            ],
+            'start_time': '2020-06-01T04:00:00',
+            'end_time': '2020-06-01T04:10:00'
+        }
+        track_id = requests.post(f'{BASE_URL}/track/', headers=self.headers, json=track_data).json().get('id')
+
+        files = {'file': ('geotag.jpg', b'test image content', 'image/jpeg')}
+        data = {'exif_data': json.dumps({'dateTime': '2020:06:01 12:05:00'})}
+        response = requests.post(f'{BASE_URL}/photo/upload', headers=self.headers, files=files, data=data)
+        photo_id = response.json().get('id')
+
+        # 上传后在后台自动标记，轮询照片坐标
+        photo = None
+        for _ in range(20):
+            photos = requests.get(f'{BASE_URL}/photo/photos', headers=self.headers).json()
+            photo = next((p for p in photos if p['id'] == photo_id), None)
+            if photo and photo['latitude'] is not None:
+                break
+            time.sleep(0.5)
+        print('标记结果:', photo)
+        ok = photo is not None and photo['latitude'] is not None \
+            and abs(photo['latitude'] - 30.05) < 1e-6 and abs(photo['longitude'] - 120.1) < 1e-6
+        if not ok:
+            print('照片坐标不是两个轨迹点之间的插值')
+
+        requests.delete(f'{BASE_URL}/photo/{photo_id}', headers=self.headers)
+        requests.delete(f'{BASE_URL}/track/{track_id}', headers=self.headers)
+        requests.put(f'{BASE_URL}/auth/profile', headers=self.headers, json={'preferences': preferences})
+        return ok
+
+    def test_stats(self):
+        print("\n=== 测试统计汇总 ===")
+        today = datetime.utcnow().date().isoformat()
+
+        def counts():
+            # from 取今天：按月、按年统计时会取整到当月/当年第一天
+            result = {}
+            for period in ('day', 'month', 'year'):
+                response = requests.get(f'{BASE_URL}/stats/timeline', headers=self.headers,
+                                        params={'period': period, 'from': today, 'to': today})
+                rows = response.json().get('rows', [])
+                result[period] = (rows[0]['journals'], rows[0]['markers']) if rows else (0, 0)
+            return result
+
+        before = counts()
+        journal_id = requests.post(f'{BASE_URL}/journal/', headers=self.headers,
+                                   json={'title': '统计测试', 'content': '<p>统计</p>'}).json().get('id')
+        marker_id = requests.post(f'{BASE_URL}/map/markers', headers=self.headers,
+                                  json={'position': [39.9, 116.4], 'description': '统计测试'}).json().get('id')
+        created = counts()
+        requests.delete(f'{BASE_URL}/journal/{journal_id}', headers=self.headers)
+        requests.delete(f'{BASE_URL}/map/markers/{marker_id}', headers=self.headers)
+        deleted = counts()
+        print('创建前:', before, '创建后:', created, '删除后:', deleted)
+
+        ok = deleted == before and all(
+            created[period] == (before[period][0] + 1, before[period][1] + 1) for period in before)
+        if not ok:
+            print('统计汇总与创建/删除操作不一致')
+        return ok
+
     def run_all_tests(self):
         if not self.wait_for_server():
             print("无法连接到服务器，请确保服务器已启动")
@@ -282,6 +415,9 @@ class TravelJournalTest:
             self.test_markers()
             self.test_journal()
             self.test_photos()
+            self.test_import()
+            self.test_geotag()
+            self.test_stats()
             self.test_tracking()
             print("\n所有测试完成!")
         except Exception as e: